@@ -0,0 +1,124 @@
+"""Top-k cosine search kernel for the semantic caches.
+
+Both caches store unit-normalized float32 vectors, so cosine similarity is a
+plain dot product and the scan over cached rows is the hot inner loop of
+every lookup. When numba is installed the scan is JIT-compiled with a
+parallel, fastmath dot product and an insertion-sort top-k; otherwise a
+vectorized numpy argpartition path gives the same results. numba is
+optional — nothing here requires it.
+"""
+import numpy as np
+
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+
+def _topk_cosine_numpy(query: np.ndarray, db: np.ndarray, k: int):
+    scores = db @ query
+    idx = np.argpartition(scores, -k)[-k:]
+    idx = idx[np.argsort(scores[idx])[::-1]]
+    return idx, scores[idx]
+
+
+if _HAS_NUMBA:
+    @njit(parallel=True, cache=True, fastmath=True)
+    def _topk_cosine_numba(query, db, k):
+        n, dim = db.shape
+        scores = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            acc = np.float32(0.0)
+            for j in range(dim):
+                acc += db[i, j] * query[j]
+            scores[i] = acc
+
+        # k is tiny (usually 1), so an insertion-sorted running top-k beats
+        # a full argsort of the score array
+        top_idx = np.empty(k, dtype=np.int64)
+        top_val = np.full(k, np.float32(-2.0), dtype=np.float32)
+        for i in range(n):
+            score = scores[i]
+            if score > top_val[k - 1]:
+                pos = k - 1
+                while pos > 0 and score > top_val[pos - 1]:
+                    top_val[pos] = top_val[pos - 1]
+                    top_idx[pos] = top_idx[pos - 1]
+                    pos -= 1
+                top_val[pos] = score
+                top_idx[pos] = i
+        return top_idx, top_val
+
+
+def quantize_int8(vectors: np.ndarray) -> np.ndarray:
+    """Quantize unit vectors to int8 (round(v * 127), saturating).
+
+    Quarter the memory traffic of a float32 scan; cosine error from the
+    rounding is well below the cache-hit threshold.
+    """
+    return np.clip(np.rint(vectors * 127.0), -127, 127).astype(np.int8)
+
+
+def _topk_cosine_int8_numpy(query_q: np.ndarray, db_q: np.ndarray,
+                            inv_norms: np.ndarray, k: int):
+    scores = (db_q.astype(np.int32) @ query_q.astype(np.int32)).astype(np.float32)
+    scores *= inv_norms
+    idx = np.argpartition(scores, -k)[-k:]
+    idx = idx[np.argsort(scores[idx])[::-1]]
+    return idx, scores[idx]
+
+
+if _HAS_NUMBA:
+    @njit(parallel=True, cache=True, fastmath=True)
+    def _topk_cosine_int8_numba(query_q, db_q, inv_norms, k):
+        n, dim = db_q.shape
+        scores = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            acc = np.int32(0)
+            for j in range(dim):
+                acc += np.int32(db_q[i, j]) * np.int32(query_q[j])
+            scores[i] = np.float32(acc) * inv_norms[i]
+
+        top_idx = np.empty(k, dtype=np.int64)
+        top_val = np.full(k, np.float32(-2.0e9), dtype=np.float32)
+        for i in range(n):
+            score = scores[i]
+            if score > top_val[k - 1]:
+                pos = k - 1
+                while pos > 0 and score > top_val[pos - 1]:
+                    top_val[pos] = top_val[pos - 1]
+                    top_idx[pos] = top_idx[pos - 1]
+                    pos -= 1
+                top_val[pos] = score
+                top_idx[pos] = i
+        return top_idx, top_val
+
+
+def topk_cosine_int8(query_q: np.ndarray, db_q: np.ndarray,
+                     inv_norms: np.ndarray, k: int = 1):
+    """Top-k cosine over int8-quantized rows.
+
+    db_q rows and query_q are quantize_int8 outputs; inv_norms holds
+    1 / (||row|| * ||query||) per row so the int32 dot products come back
+    out as true cosines of the quantized vectors.
+    """
+    k = min(k, db_q.shape[0])
+    if _HAS_NUMBA:
+        return _topk_cosine_int8_numba(np.ascontiguousarray(query_q),
+                                       np.ascontiguousarray(db_q),
+                                       inv_norms, k)
+    return _topk_cosine_int8_numpy(query_q, db_q, inv_norms, k)
+
+
+def topk_cosine(query: np.ndarray, db: np.ndarray, k: int = 1):
+    """Return (indices, scores) of the k rows of db most similar to query.
+
+    query and the rows of db must be unit-normalized float32; scores are
+    cosine similarities in descending order.
+    """
+    k = min(k, db.shape[0])
+    if _HAS_NUMBA:
+        return _topk_cosine_numba(np.ascontiguousarray(query),
+                                  np.ascontiguousarray(db), k)
+    return _topk_cosine_numpy(query, db, k)
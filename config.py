@@ -1,18 +1,26 @@
 import os
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 
 load_dotenv()
 
 class Config:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     
-    # LLM Configuration
+    # LLM Configuration: classification and short summaries are easy tasks
+    # where the mini model matches quality at a fraction of the cost; keep
+    # the full model for reply prose
     LLM_MODEL = "gpt-4o"
+    CLASSIFY_MODEL = "gpt-4o-mini"
+    REPLY_MODEL = "gpt-4o"
     LLM_TEMPERATURE = 0.1
     
     # Memory Configuration
     MAX_HISTORY_LENGTH = 5
+    MEMORY_SUMMARY_MODEL = "gpt-4o-mini"  # cheap model for rolling summaries
+
+    # Semantic Cache Configuration
+    EMBEDDING_MODEL = "text-embedding-3-small"
+    SEMANTIC_CACHE_THRESHOLD = 0.15  # max cosine distance for a cache hit
     
     # Escalation Configuration
     COMPLAINT_ESCALATION_THRESHOLD = 0.8
@@ -20,9 +28,34 @@ class Config:
     # Tone Configuration
     DEFAULT_TONE = "neutral"  # formal, friendly, neutral
 
-def get_llm():
+    # Async Configuration
+    MAX_CONNECTIONS = 100  # connection pool size for concurrent LLM calls
+
+    # Rate Limit Configuration (per-process share of the model's quota)
+    RPM = 500       # requests per minute
+    TPM = 300_000   # tokens per minute
+
+def get_memory_llm():
+    """Cheap low-temperature model for rolling memory summaries"""
+    # Imported lazily: pulling in langchain_openai (and its httpx/tiktoken
+    # import graph) at module load would tax every CLI one-shot
+    from langchain_openai import ChatOpenAI
     return ChatOpenAI(
-        model=Config.LLM_MODEL,
-        temperature=Config.LLM_TEMPERATURE,
+        model=Config.MEMORY_SUMMARY_MODEL,
+        temperature=0,
         api_key=Config.OPENAI_API_KEY
+    )
+
+def get_llm(task: str = "reply"):
+    """Return the LLM for a task: "classify" gets the mini model, "reply"
+    (the default) the full one."""
+    import httpx
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=Config.CLASSIFY_MODEL if task == "classify" else Config.REPLY_MODEL,
+        temperature=Config.LLM_TEMPERATURE,
+        api_key=Config.OPENAI_API_KEY,
+        http_async_client=httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=Config.MAX_CONNECTIONS)
+        )
     )
\ No newline at end of file
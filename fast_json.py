@@ -0,0 +1,20 @@
+"""loads/dumps that use orjson when it is installed.
+
+JSON is parsed on every email here — LLM completions, memory payloads,
+batch result lines — and orjson does that work in native code at several
+times stdlib speed. orjson is optional: without it these are thin aliases
+for the stdlib functions, with the same JSONDecodeError surface so caller
+error handling is unchanged.
+"""
+try:
+    import orjson
+    from json import JSONDecodeError  # orjson raises a subclass of this
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+except ImportError:
+    from json import JSONDecodeError, loads, dumps  # noqa: F401
@@ -1,51 +1,156 @@
-import json
+import os
+import sqlite3
+import time
+
+import fast_json
 from typing import List, Dict, Any
 from config import Config
 
 class MemoryManager:
-    def __init__(self, memory_file: str = "memory.json"):
+    def __init__(self, memory_file: str = "memory.db"):
         self.memory_file = memory_file
         self.max_length = Config.MAX_HISTORY_LENGTH
-    
+        migrate = not os.path.exists(self.memory_file)
+        # WAL lets concurrent processes share the store without lost updates;
+        # autocommit (isolation_level=None) keeps each write a single fsync
+        self._db = sqlite3.connect(
+            self.memory_file, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "email_from TEXT, ts INTEGER, payload TEXT)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_from_ts "
+            "ON messages(email_from, ts DESC)"
+        )
+        # Rolling per-sender summary, updated append-only so the prompt
+        # prefix it produces stays stable across calls
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "email_from TEXT PRIMARY KEY, summary TEXT)"
+        )
+        self._summarizer = None
+        self._summarizer_failed = False
+        if migrate:
+            self._import_legacy_files()
+
+    def _import_legacy_files(self):
+        """One-time migration from the old memory.jsonl / memory.json formats"""
+        records = []
+        try:
+            with open("memory.jsonl", 'r') as f:
+                for line in f:
+                    try:
+                        record = fast_json.loads(line)
+                    except fast_json.JSONDecodeError:
+                        continue
+                    email_from = record.pop("from_key", None) or record.get("from", "")
+                    records.append((email_from, record))
+        except FileNotFoundError:
+            try:
+                with open("memory.json", 'r') as f:
+                    all_memory = fast_json.loads(f.read())
+            except (FileNotFoundError, fast_json.JSONDecodeError):
+                return
+            for email_from, messages in all_memory.items():
+                for msg in messages[-self.max_length:]:
+                    records.append((email_from, msg))
+
+        for email_from, msg in records:
+            self.save_memory(email_from, msg)
+
     def load_memory(self, email_from: str) -> List[Dict[str, Any]]:
         """Load conversation history for a specific email address"""
-        try:
-            with open(self.memory_file, 'r') as f:
-                all_memory = json.load(f)
-                return all_memory.get(email_from, [])[-self.max_length:]
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
-    
+        rows = self._db.execute(
+            "SELECT payload FROM messages WHERE email_from=? "
+            "ORDER BY ts DESC, rowid DESC LIMIT ?",
+            (email_from, self.max_length)
+        ).fetchall()
+        # Query returns newest-first; present oldest-first like before
+        return [fast_json.loads(payload) for (payload,) in reversed(rows)]
+
     def save_memory(self, email_from: str, new_message: Dict[str, Any]):
         """Save new message to conversation history"""
-        try:
-            with open(self.memory_file, 'r') as f:
-                all_memory = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            all_memory = {}
-        
-        if email_from not in all_memory:
-            all_memory[email_from] = []
-        
-        all_memory[email_from].append(new_message)
-        
-        # Keep only the last N messages
-        all_memory[email_from] = all_memory[email_from][-self.max_length:]
-        
-        with open(self.memory_file, 'w') as f:
-            json.dump(all_memory, f, indent=2)
-    
+        self._db.execute(
+            "INSERT INTO messages(email_from, ts, payload) VALUES (?, ?, ?)",
+            (email_from, time.time_ns(), fast_json.dumps(new_message))
+        )
+        # Keep only the last N messages per sender
+        self._db.execute(
+            "DELETE FROM messages WHERE rowid IN ("
+            "SELECT rowid FROM messages WHERE email_from=? "
+            "ORDER BY ts DESC, rowid DESC LIMIT -1 OFFSET ?)",
+            (email_from, self.max_length)
+        )
+        self._update_summary(email_from, new_message)
+
+    def _update_summary(self, email_from: str, new_message: Dict[str, Any]):
+        """Fold the new message into the sender's rolling summary"""
+        row = self._db.execute(
+            "SELECT summary FROM summaries WHERE email_from=?", (email_from,)
+        ).fetchone()
+        old_summary = row[0] if row else ""
+        new_line = (
+            f"{new_message.get('subject', 'No subject')}: "
+            f"{new_message.get('body', '')[:300]}"
+        )
+        summary = self._summarize(old_summary, new_line)
+        self._db.execute(
+            "INSERT OR REPLACE INTO summaries(email_from, summary) VALUES (?, ?)",
+            (email_from, summary)
+        )
+
+    def _summarize(self, old_summary: str, new_line: str) -> str:
+        """Condense old summary + new message with a cheap model"""
+        if self._summarizer is None and not self._summarizer_failed:
+            try:
+                from config import get_memory_llm
+                self._summarizer = get_memory_llm()
+            except Exception as e:
+                print(f"Warning: summary LLM initialization failed: {e}")
+                self._summarizer_failed = True
+
+        if self._summarizer is not None:
+            prompt = (
+                "Update this rolling summary of a customer's conversation history "
+                "with the new message. Keep it under 4 lines, most recent points last.\n\n"
+                f"Current summary:\n{old_summary or '(none)'}\n\n"
+                f"New message:\n{new_line}\n\n"
+                "Updated summary:"
+            )
+            try:
+                return self._summarizer.invoke(prompt).content.strip()
+            except Exception as e:
+                print(f"Summary LLM error: {e}")
+
+        # Fallback: append the new line and keep the tail bounded
+        combined = f"{old_summary}\n- {new_line}" if old_summary else f"- {new_line}"
+        return combined[-1500:]
+
     def get_memory_context(self, email_from: str) -> str:
-        """Get formatted memory context for LLM"""
+        """Get formatted memory context for LLM.
+
+        Returns the rolling summary plus only the latest raw message instead
+        of the full verbatim history, bounding prompt tokens per reply call.
+        """
         history = self.load_memory(email_from)
         if not history:
             return "No previous conversation history."
-        
-        context_parts = ["Previous conversation history:"]
-        for i, msg in enumerate(history, 1):
-            context_parts.append(f"{i}. From: {msg.get('from', 'Unknown')}")
-            context_parts.append(f"   Subject: {msg.get('subject', 'No subject')}")
-            context_parts.append(f"   Body: {msg.get('body', 'No content')}")
-            context_parts.append("")
-        
-        return "\n".join(context_parts)
\ No newline at end of file
+
+        row = self._db.execute(
+            "SELECT summary FROM summaries WHERE email_from=?", (email_from,)
+        ).fetchone()
+        latest = history[-1]
+
+        context_parts = []
+        if row and row[0]:
+            context_parts.append(f"Rolling summary of previous conversations:\n{row[0]}")
+        context_parts.append(
+            "Latest message:\n"
+            f"From: {latest.get('from', 'Unknown')}\n"
+            f"Subject: {latest.get('subject', 'No subject')}\n"
+            f"Body: {latest.get('body', 'No content')}"
+        )
+        return "\n\n".join(context_parts)
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import time
+
+from config import Config
+
+
+class RateLimiter:
+    """Token-bucket throttler for OpenAI requests.
+
+    Instead of relying on retry/backoff after a 429, block until there is
+    request and token capacity under the model's RPM/TPM limits, so bulk
+    runs never trigger retry storms. Capacity refills continuously with
+    elapsed time. Thread-safe, so it covers both the sync path and async
+    nodes running in executor threads.
+    """
+
+    def __init__(self, rpm: int = None, tpm: int = None):
+        self.rpm = rpm or Config.RPM
+        self.tpm = tpm or Config.TPM
+        self._request_capacity = float(self.rpm)
+        self._token_capacity = float(self.tpm)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._request_capacity = min(
+            self.rpm, self._request_capacity + self.rpm * elapsed / 60.0
+        )
+        self._token_capacity = min(
+            self.tpm, self._token_capacity + self.tpm * elapsed / 60.0
+        )
+
+    def _try_acquire(self, estimated_tokens: int) -> bool:
+        with self._lock:
+            self._refill()
+            if self._request_capacity >= 1 and self._token_capacity >= estimated_tokens:
+                self._request_capacity -= 1
+                self._token_capacity -= estimated_tokens
+                return True
+        return False
+
+    def acquire(self, estimated_tokens: int):
+        """Block until there is capacity for one request of estimated_tokens"""
+        while not self._try_acquire(estimated_tokens):
+            time.sleep(0.05)
+
+    async def aacquire(self, estimated_tokens: int):
+        """acquire for coroutines: waits with asyncio.sleep so a throttled
+        call yields to the event loop instead of stalling it"""
+        while not self._try_acquire(estimated_tokens):
+            await asyncio.sleep(0.05)
+
+    @staticmethod
+    def estimate_tokens(prompt: str, max_output_tokens: int = 500) -> int:
+        """Rough token estimate: ~4 characters per token plus output headroom"""
+        return len(prompt) // 4 + max_output_tokens
@@ -1,6 +1,5 @@
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema import HumanMessage
+from langchain_openai import ChatOpenAI
+from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, field_validator
 from typing import Optional
 import os
@@ -25,7 +24,7 @@ class LLMEmailAnalyzer:
         self.api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("Please set your OpenAI API key or pass it as a parameter.")
-        self.llm = ChatOpenAI(openai_api_key=self.api_key, model_name=model, temperature=0)
+        self.llm = ChatOpenAI(api_key=self.api_key, model=model, temperature=0)
 
         self.prompt_template = ChatPromptTemplate.from_template(
             """You are an email analysis assistant.
@@ -45,9 +44,8 @@ Email:
 
     def analyze(self, email_text: str) -> EmailAnalysis:
         prompt = self.prompt_template.format_prompt(text=email_text).to_messages()
-        response = self.llm(prompt)
-        # LangChain returns a list of messages, pick content from last message
-        content = response.content if hasattr(response, 'content') else response[-1].content
+        response = self.llm.invoke(prompt)
+        content = response.content
 
         import json
         try:
@@ -0,0 +1,259 @@
+import hashlib
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import fast_json
+from cache_search import quantize_int8, topk_cosine, topk_cosine_int8
+from config import Config
+
+
+# Texts per embed_documents call when batch-embedding: one API round trip
+# covers a whole chunk instead of a call per text
+_EMBED_BATCH_SIZE = 64
+
+# Noise stripped before fingerprinting an email: quoted reply history,
+# punctuation, and whitespace/case differences — the edits people make when
+# resending the same email
+_QUOTED_LINE_RE = re.compile(r"^>.*$", re.MULTILINE)
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _embedder():
+    """Shared constructor for the embeddings client used by both caches"""
+    try:
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(
+            model=Config.EMBEDDING_MODEL,
+            api_key=Config.OPENAI_API_KEY
+        )
+    except Exception as e:
+        print(f"Warning: Embeddings initialization failed: {e}")
+        return None
+
+
+class SemanticLLMCache:
+    """Embedding-based cache for LLM completions.
+
+    Near-duplicate support emails ("payment failed", "card declined") produce
+    semantically identical completions, so before calling the LLM we embed the
+    email body and look for a close-enough cached entry. Entries are stored
+    per prompt-template so classify and generate_reply results never mix.
+    """
+
+    def __init__(self):
+        self.embeddings = _embedder()
+
+        # template hash -> (list of unit vectors, list of completions)
+        self._store: Dict[str, Tuple[List[np.ndarray], List[str]]] = {}
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        if self.embeddings is None:
+            return None
+        try:
+            vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        except Exception as e:
+            print(f"Embedding error: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _template_key(prompt_template: str) -> str:
+        return hashlib.sha1(prompt_template.encode()).hexdigest()
+
+    def lookup(self, prompt_template: str, text: str) -> Optional[str]:
+        """Return a cached completion for a semantically similar text, if any"""
+        vectors, completions = self._store.get(self._template_key(prompt_template), ([], []))
+        if not vectors:
+            return None
+
+        query = self._embed(text)
+        if query is None:
+            return None
+
+        indices, scores = topk_cosine(query, np.stack(vectors), k=1)
+        if 1.0 - scores[0] < Config.SEMANTIC_CACHE_THRESHOLD:
+            return completions[int(indices[0])]
+        return None
+
+    def insert(self, prompt_template: str, text: str, completion: str):
+        """Cache a completion under the embedding of its input text"""
+        vector = self._embed(text)
+        if vector is None:
+            return
+        vectors, completions = self._store.setdefault(
+            self._template_key(prompt_template), ([], [])
+        )
+        vectors.append(vector)
+        completions.append(completion)
+
+
+class SemanticReplyCache:
+    """Whole-reply semantic cache consulted before the workflow runs.
+
+    Support inboxes have heavily skewed query distributions — many incoming
+    emails are near-duplicates of tickets already answered. Embedding the
+    subject + body and returning the cached reply on a close match turns a
+    repeat ticket into one embedding lookup instead of a multi-LLM-call
+    workflow run.
+
+    The cache persists across runs: vectors go to <path>.npz and the reply
+    map to <path>.json, written through on insert and reloaded on startup,
+    so a restart does not throw away every answered ticket.
+    """
+
+    def __init__(self, path: str = "reply_cache"):
+        self.embeddings = _embedder()
+        self._path = path
+        # Rows are int8-quantized unit vectors (quarter the scan bandwidth
+        # of float32) with per-row reciprocal norms to recover true cosines
+        self._vectors: List[np.ndarray] = []
+        self._inv_norms: List[float] = []
+        self._replies: List[Dict[str, Any]] = []
+        # Normalized fingerprint -> reply index: resends with trivial edits
+        # (typo fix, punctuation, quoted history) hit here before any
+        # embedding call is made
+        self._fingerprints: Dict[str, int] = {}
+        self._load()
+
+    def _load(self):
+        """Restore vectors and replies persisted by a previous run"""
+        try:
+            with np.load(f"{self._path}.npz") as data:
+                vectors = data["vectors"]
+                inv_norms = data["inv_norms"]
+            with open(f"{self._path}.json", "r") as f:
+                payload = fast_json.loads(f.read())
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Reply cache load error: {e}")
+            return
+        self._vectors = [row for row in vectors.astype(np.int8)]
+        self._inv_norms = [float(n) for n in inv_norms]
+        self._replies = payload.get("replies", [])
+        self._fingerprints = payload.get("fingerprints", {})
+
+    def _persist(self):
+        """Write the current cache state through to disk"""
+        try:
+            np.savez(
+                f"{self._path}.npz",
+                vectors=np.stack(self._vectors) if self._vectors else np.empty((0, 0), np.int8),
+                inv_norms=np.asarray(self._inv_norms, dtype=np.float32)
+            )
+            with open(f"{self._path}.json", "w") as f:
+                f.write(fast_json.dumps({
+                    "replies": self._replies,
+                    "fingerprints": self._fingerprints
+                }))
+        except Exception as e:
+            print(f"Reply cache persist error: {e}")
+
+    def _append_vector(self, vector: np.ndarray):
+        quantized = quantize_int8(vector)
+        norm = float(np.linalg.norm(quantized.astype(np.float32)))
+        self._vectors.append(quantized)
+        self._inv_norms.append(1.0 / norm if norm else 0.0)
+
+    @staticmethod
+    def _key_text(email_input: Dict[str, Any]) -> str:
+        return f"{email_input.get('subject', '')}\n{email_input.get('body', '')}"
+
+    @classmethod
+    def _fingerprint(cls, email_input: Dict[str, Any]) -> str:
+        """Hash of the email with case, punctuation, whitespace and quoted
+        reply history stripped, so small-edit resends collapse to one key"""
+        text = cls._key_text(email_input).lower()
+        text = _QUOTED_LINE_RE.sub("", text)
+        text = _PUNCT_RE.sub("", text)
+        text = _WHITESPACE_RE.sub(" ", text).strip()
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def _readdress(self, index: int, email_input: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the cached reply re-addressed to the current sender"""
+        reply = dict(self._replies[index])
+        reply["to"] = email_input.get("from", reply.get("to"))
+        return reply
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        if self.embeddings is None:
+            return None
+        try:
+            vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        except Exception as e:
+            print(f"Embedding error: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, email_input: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the cached reply for a semantically similar email, if any"""
+        if not self._vectors:
+            return None
+
+        # Fingerprint match first: a trivially edited resend costs one hash
+        # and one dict probe, no embedding round trip
+        hit = self._fingerprints.get(self._fingerprint(email_input))
+        if hit is not None:
+            return self._readdress(hit, email_input)
+
+        query = self._embed(self._key_text(email_input))
+        if query is None:
+            return None
+
+        query_q = quantize_int8(query)
+        query_norm = float(np.linalg.norm(query_q.astype(np.float32)))
+        if not query_norm:
+            return None
+        inv_norms = np.asarray(self._inv_norms, dtype=np.float32) / query_norm
+        indices, scores = topk_cosine_int8(query_q, np.stack(self._vectors), inv_norms, k=1)
+        if 1.0 - scores[0] < Config.SEMANTIC_CACHE_THRESHOLD:
+            return self._readdress(int(indices[0]), email_input)
+        return None
+
+    def insert(self, email_input: Dict[str, Any], reply: Dict[str, Any]):
+        """Cache a generated reply under the embedding of its email"""
+        vector = self._embed(self._key_text(email_input))
+        if vector is None:
+            return
+        self._append_vector(vector)
+        self._replies.append(dict(reply))
+        self._fingerprints[self._fingerprint(email_input)] = len(self._replies) - 1
+        self._persist()
+
+    def _embed_many(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Embed many texts with chunked batch calls; rows are unit vectors"""
+        if self.embeddings is None or not texts:
+            return None
+        vectors = []
+        try:
+            for start in range(0, len(texts), _EMBED_BATCH_SIZE):
+                vectors.extend(
+                    self.embeddings.embed_documents(texts[start:start + _EMBED_BATCH_SIZE])
+                )
+        except Exception as e:
+            print(f"Embedding error: {e}")
+            return None
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0.0] = 1.0
+        return matrix / norms
+
+    def insert_many(self, pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]]):
+        """Cache many (email_input, reply) pairs with one embedding round.
+
+        Bulk ingest inserts a whole mailbox at once; batching the embedding
+        calls turns N API round trips into ceil(N / 64).
+        """
+        matrix = self._embed_many([self._key_text(email) for email, _ in pairs])
+        if matrix is None:
+            return
+        for vector, (email_input, reply) in zip(matrix, pairs):
+            self._append_vector(vector)
+            self._replies.append(dict(reply))
+            self._fingerprints[self._fingerprint(email_input)] = len(self._replies) - 1
+        self._persist()
@@ -1,16 +1,89 @@
+from dataclasses import dataclass
 from typing import TypedDict, List, Optional, Dict, Any
 from typing_extensions import Annotated
+
+import numpy as np
 from pydantic import BaseModel
 
-class EmailMessage(BaseModel):
+# Internal state containers are plain dataclasses: these shapes only ever
+# come from our own code, so Pydantic validation on every construction is
+# pure overhead. slots=True drops the per-instance __dict__; frozen=True
+# keeps workflow state immutable as it flows between nodes.
+@dataclass(slots=True, frozen=True)
+class EmailMessage:
     from_email: str
     to: str
     subject: str
     body: str
 
-class ConversationHistory(BaseModel):
+@dataclass(slots=True, frozen=True)
+class ConversationHistory:
     messages: List[Dict[str, Any]]
 
+# Structure-of-arrays view of a history: bulk scans (recency ordering,
+# token budgeting) walk parallel arrays instead of poking into N scattered
+# message dicts, and timestamps become one datetime64 array that numpy can
+# sort without per-message parsing.
+@dataclass(slots=True)
+class HistorySoA:
+    from_emails: List[str]
+    tos: List[str]
+    bodies: List[str]
+    ts: np.ndarray
+
+    @classmethod
+    def from_messages(cls, messages: List[Any]) -> "HistorySoA":
+        """Build the column view from a list of message dicts.
+
+        Timestamps are parsed defensively: anything that is not an ISO
+        datetime ("yesterday", free text) becomes NaT, which recency_order
+        already treats as unusable.
+        """
+        dicts = [m if isinstance(m, dict) else {"body": str(m)} for m in messages]
+        ts = np.full(len(dicts), np.datetime64("NaT"), dtype="datetime64[s]")
+        for i, message in enumerate(dicts):
+            try:
+                ts[i] = np.datetime64(str(message.get("timestamp", "")) or "NaT", "s")
+            except ValueError:
+                pass
+        return cls(
+            from_emails=[m.get("from", "") for m in dicts],
+            tos=[m.get("to", "") for m in dicts],
+            bodies=[str(m.get("body", m)) for m in dicts],
+            ts=ts
+        )
+
+    def __len__(self) -> int:
+        return len(self.bodies)
+
+    def recency_order(self) -> Optional[np.ndarray]:
+        """Indices sorting messages oldest-to-newest, or None when the
+        messages are already in order or timestamps are unusable"""
+        if len(self.ts) == 0 or np.isnat(self.ts).any():
+            return None
+        order = np.argsort(self.ts, kind="stable")
+        if np.array_equal(order, np.arange(len(order))):
+            return None
+        return order
+
+# Structured-output schemas for the LLM nodes; defaults double as the
+# fallback values when the LLM is unavailable
+class IntentResult(BaseModel):
+    intent: str = "request"
+    tone: str = "neutral"
+    confidence: float = 0.9
+
+class ClassifySummarizeResult(BaseModel):
+    intent: str = "request"
+    tone: str = "neutral"
+    confidence: float = 0.9
+    summary: str = ""
+
+class ReplyResult(BaseModel):
+    subject: str = "Re: Your Request"
+    body: str = "Thank you for your email. We have received your message and will get back to you shortly."
+    tone_used: str = "professional"
+
 class EmailState(TypedDict):
     # Input
     email: EmailMessage
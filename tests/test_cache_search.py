@@ -0,0 +1,50 @@
+import numpy as np
+from cache_search import quantize_int8, topk_cosine, topk_cosine_int8
+
+def _unit_rows(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = rng.standard_normal((n, dim)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+class TestCacheSearch:
+    def test_topk_cosine_matches_brute_force(self):
+        db = _unit_rows(200, 32)
+        query = db[17]
+
+        indices, scores = topk_cosine(query, db, k=3)
+
+        brute = db @ query
+        assert indices[0] == np.argmax(brute)
+        assert np.allclose(scores, np.sort(brute)[::-1][:3], atol=1e-5)
+
+    def test_topk_cosine_clamps_k(self):
+        db = _unit_rows(2, 8)
+        indices, scores = topk_cosine(db[0], db, k=10)
+        assert len(indices) == 2
+        assert len(scores) == 2
+
+    def test_quantize_int8_range_and_roundtrip(self):
+        vectors = _unit_rows(50, 64)
+        quantized = quantize_int8(vectors)
+
+        assert quantized.dtype == np.int8
+        assert quantized.min() >= -127
+        assert quantized.max() <= 127
+        assert np.abs(quantized / 127.0 - vectors).max() < 0.005
+
+    def test_topk_cosine_int8_matches_float_scan(self):
+        db = _unit_rows(300, 64)
+        db_q = quantize_int8(db)
+        inv_norms = 1.0 / np.linalg.norm(db_q.astype(np.float32), axis=1)
+
+        query = db[123]
+        query_q = quantize_int8(query)
+        query_norm = np.linalg.norm(query_q.astype(np.float32))
+
+        indices, scores = topk_cosine_int8(
+            query_q, db_q, (inv_norms / query_norm).astype(np.float32), k=1
+        )
+
+        brute = db @ query
+        assert indices[0] == np.argmax(brute)
+        assert abs(scores[0] - brute.max()) < 0.01
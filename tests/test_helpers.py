@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+import fast_json
+import main
+from main import SmartEmailAssistant, _compact_history
+from nodes import EmailNodes
+from rate_limiter import RateLimiter
+from state import HistorySoA
+
+class TestRateLimiter:
+    def test_acquire_consumes_capacity(self):
+        limiter = RateLimiter(rpm=10, tpm=1000)
+        limiter.acquire(300)
+        assert limiter._request_capacity <= 9
+        assert limiter._token_capacity <= 700
+
+    def test_try_acquire_refuses_over_budget(self):
+        limiter = RateLimiter(rpm=10, tpm=100)
+        assert limiter._try_acquire(500) is False
+
+    def test_estimate_tokens(self):
+        assert RateLimiter.estimate_tokens("x" * 400, max_output_tokens=0) == 100
+
+class TestFastJson:
+    def test_roundtrip(self):
+        payload = {"intent": "complaint", "confidence": 0.9, "tags": ["a", "b"]}
+        assert fast_json.loads(fast_json.dumps(payload)) == payload
+
+    def test_invalid_input_raises_decode_error(self):
+        with pytest.raises(fast_json.JSONDecodeError):
+            fast_json.loads("not json")
+
+class TestHistorySoA:
+    def test_from_messages_columns(self):
+        soa = HistorySoA.from_messages([
+            {"from": "a@x.com", "to": "s@y.com", "body": "first",
+             "timestamp": "2024-01-01T10:00:00"},
+            {"from": "b@x.com", "to": "s@y.com", "body": "second",
+             "timestamp": "2024-01-02T10:00:00"},
+        ])
+        assert len(soa) == 2
+        assert soa.bodies == ["first", "second"]
+        assert soa.recency_order() is None  # already oldest-first
+
+    def test_recency_order_sorts_out_of_order_messages(self):
+        soa = HistorySoA.from_messages([
+            {"body": "newer", "timestamp": "2024-01-05T10:00:00"},
+            {"body": "older", "timestamp": "2024-01-01T10:00:00"},
+        ])
+        assert list(soa.recency_order()) == [1, 0]
+
+    def test_non_iso_timestamps_become_nat(self):
+        soa = HistorySoA.from_messages([
+            {"body": "a", "timestamp": "yesterday"},
+            {"body": "b", "timestamp": "2024-01-01T10:00:00"},
+        ])
+        assert np.isnat(soa.ts[0])
+        assert soa.recency_order() is None
+
+class TestCompactHistory:
+    def test_short_history_is_untouched(self):
+        history = [{"body": "one"}, {"body": "two"}]
+        assert _compact_history(history) == history
+
+    def test_older_messages_collapse_into_summary(self, monkeypatch):
+        monkeypatch.setattr(main, "_summarize_history", lambda combined: "older summary")
+        history = [{"body": f"message {i}"} for i in range(5)]
+
+        compacted = _compact_history(history)
+
+        assert compacted[0] == {"summary": "older summary"}
+        assert compacted[1:] == history[2:]
+
+    def test_non_iso_timestamps_do_not_crash(self, monkeypatch):
+        monkeypatch.setattr(main, "_summarize_history", lambda combined: "summary")
+        history = [
+            {"body": f"msg {i}", "timestamp": ts}
+            for i, ts in enumerate(["yesterday", "last week", "", "soon", "later"])
+        ]
+        compacted = _compact_history(history)
+        assert compacted[0] == {"summary": "summary"}
+
+class TestParseJsonArray:
+    def test_extracts_wrapped_array(self):
+        response = 'Here you go: [{"intent": "request"}, {"intent": "inquiry"}]'
+        parsed = SmartEmailAssistant._parse_json_array(response, 2)
+        assert parsed == [{"intent": "request"}, {"intent": "inquiry"}]
+
+    def test_wrong_length_returns_none(self):
+        assert SmartEmailAssistant._parse_json_array('[{"a": 1}]', 2) is None
+
+    def test_malformed_returns_none(self):
+        assert SmartEmailAssistant._parse_json_array("no array here", 1) is None
+
+    def test_non_object_items_become_none(self):
+        parsed = SmartEmailAssistant._parse_json_array('[{"a": 1}, 42]', 2)
+        assert parsed == [{"a": 1}, None]
+
+class TestDecisionNodeBatch:
+    def setup_method(self):
+        self.nodes = EmailNodes()
+
+    def test_matches_decision_node(self):
+        states = [
+            {"intent": "complaint", "confidence": 0.7, "tone": "angry"},
+            {"intent": "inquiry", "confidence": 0.9, "tone": "neutral"},
+            {"intent": "inquiry", "confidence": 0.6, "tone": "angry and frustrated"},
+            {"intent": "complaint", "confidence": 0.95, "tone": "happy"},
+        ]
+        batched = self.nodes.decision_node_batch(states)
+        for state, result in zip(states, batched):
+            assert result == self.nodes.decision_node(state)
+
+    def test_empty_batch(self):
+        assert self.nodes.decision_node_batch([]) == []